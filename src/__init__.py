@@ -1,2 +1,6 @@
 from . import serial_comm
-from . import sim_modem
\ No newline at end of file
+from . import sim_modem
+from . import sms_store
+from . import cmux
+from . import file_system
+from . import signal_telemetry
\ No newline at end of file
@@ -0,0 +1,294 @@
+import threading
+import time
+
+# Basic mode frame (3GPP TS 27.010):
+# [F9] [address] [control] [length (1-2 bytes)] [info] [FCS] [F9]
+FLAG = 0xF9
+
+SABM = 0x2F
+UA = 0x63
+DM = 0x0F
+DISC = 0x43
+UIH = 0xEF
+PF = 0x10
+
+# Control channel (DLCI 0) message types, EA and C/R bits set
+MSC = 0xE3
+CLD = 0xC3
+
+
+def fcs_table() -> list:
+    # CRC-8, reversed polynomial x^8 + x^2 + x + 1
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xE0 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+FCS_TABLE = fcs_table()
+
+
+def fcs(data: bytes) -> int:
+    crc = 0xFF
+    for byte in data:
+        crc = FCS_TABLE[crc ^ byte]
+    return 0xFF - crc
+
+
+def encode_frame(dlci: int, control: int, data=b"", cr=1) -> bytes:
+    address = (dlci << 2) | (cr << 1) | 0x01
+    if len(data) > 127:
+        length = bytes([(len(data) << 1) & 0xFE, len(data) >> 7])
+    else:
+        length = bytes([(len(data) << 1) | 0x01])
+    header = bytes([address, control]) + length
+    # For UIH frames the FCS covers the header only
+    return bytes([FLAG]) + header + data + bytes([fcs(header), FLAG])
+
+
+class FrameDecoder:
+    """Splits a basic mode byte stream into (dlci, control, data) frames"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        self.buffer += data
+        frames = []
+        while True:
+            self._sync()
+            size = self._frame_size()
+            if size is None or len(self.buffer) < size:
+                return frames
+
+            frame = bytes(self.buffer[:size])
+            if frame[-1] != FLAG:
+                # Lost sync, look for the next opening flag
+                del self.buffer[0]
+                continue
+
+            header_size = 5 if not frame[3] & 0x01 else 4
+            header = frame[1:header_size]
+            # The closing flag may be the opening flag of the next frame
+            del self.buffer[: size - 1]
+            if fcs(header) != frame[-2]:
+                continue
+            frames.append((frame[1] >> 2, frame[2], frame[header_size:-2]))
+
+    def missing(self) -> int:
+        # Bytes needed to complete the pending frame, at least 1
+        self._sync()
+        size = self._frame_size()
+        if size is None:
+            return 1
+        return max(1, size - len(self.buffer))
+
+    def _sync(self) -> None:
+        start = self.buffer.find(FLAG)
+        if start < 0:
+            self.buffer.clear()
+            return
+        # Collapse repeated flags into a single opening flag
+        while start + 1 < len(self.buffer) and self.buffer[start + 1] == FLAG:
+            start += 1
+        del self.buffer[:start]
+
+    def _frame_size(self) -> int or None:
+        if len(self.buffer) < 4:
+            return None
+        if self.buffer[3] & 0x01:
+            return 4 + (self.buffer[3] >> 1) + 2
+        if len(self.buffer) < 5:
+            return None
+        return 5 + ((self.buffer[3] >> 1) | (self.buffer[4] << 7)) + 2
+
+
+class CmuxChannel:
+    """Virtual channel of a Cmux, exposes the SerialComm interface"""
+
+    def __init__(
+        self, mux, dlci, timeout=5, at_cmd_delay=0.1, byte_encoding="ISO-8859-1"
+    ):
+        self.mux = mux
+        self.dlci = dlci
+        self.timeout = timeout
+        self.at_cmd_delay = at_cmd_delay
+        self.byte_encoding = byte_encoding
+        self.lock = threading.RLock()
+        self.buffer = bytearray()
+        self.received = threading.Condition()
+
+    def send(self, cmd) -> str or None:
+        self.send_raw(cmd.encode(self.byte_encoding) + b"\r")
+
+    def send_raw(self, cmd):
+        with self.lock:
+            self.mux.write_data(self.dlci, cmd)
+            time.sleep(self.at_cmd_delay)
+
+    def read_lines(self) -> list:
+        # Like serial.readlines(): read until nothing arrives for `timeout`
+        with self.lock, self.received:
+            seen = -1
+            while len(self.buffer) != seen:
+                seen = len(self.buffer)
+                self.received.wait_for(lambda: len(self.buffer) > seen, self.timeout)
+            data = bytes(self.buffer)
+            self.buffer.clear()
+
+        read = data.split(b"\n")
+        if read[-1] == b"":
+            read.pop()
+        for i, line in enumerate(read):
+            read[i] = line.decode(self.byte_encoding).strip()
+        return read
+
+    def read_raw(self, size: int):
+        with self.lock, self.received:
+            self.received.wait_for(lambda: len(self.buffer) >= size, self.timeout)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def close(self):
+        self.mux.close_channel(self.dlci)
+
+    def receive(self, data: bytes) -> None:
+        with self.received:
+            self.buffer += data
+            self.received.notify_all()
+
+
+class Cmux:
+    """3GPP TS 27.010 basic mode multiplexer over a single SerialComm
+
+    The multiplexer owns the port once started: it only uses the lock free
+    write_raw/read_available, so frame writes never wait for the reader.
+    """
+
+    def __init__(self, comm, frame_size=31, timeout=5):
+        self.comm = comm
+        # N1, maximum info size of a frame. 31 is the AT+CMUX default
+        self.frame_size = frame_size
+        self.timeout = timeout
+        self.channels = {}
+        self.decoder = FrameDecoder()
+        self.write_lock = threading.Lock()
+        self.responses = {}
+        self.running = False
+        self.reader = None
+
+    def start(self, command="AT+CMUX=0") -> None:
+        self.comm.write_raw(command.encode("ascii") + b"\r")
+        read = self._read_reply()
+
+        # b'AT+CMUX=0\r\r\nOK\r\n'
+        if not read.endswith(b"OK\r\n"):
+            raise Exception("Command failed")
+
+        self.running = True
+        self.reader = threading.Thread(target=self._read_frames, daemon=True)
+        self.reader.start()
+        self._connect(0)
+
+    def open_channel(self, dlci: int, at_cmd_delay=0.1) -> CmuxChannel:
+        if dlci < 1 or dlci > 63:
+            raise Exception("DLCI must be between 1 and 63")
+        if dlci in self.channels:
+            return self.channels[dlci]
+
+        channel = CmuxChannel(
+            self, dlci, timeout=self.timeout, at_cmd_delay=at_cmd_delay
+        )
+        self.channels[dlci] = channel
+        try:
+            self._connect(dlci)
+        except Exception:
+            del self.channels[dlci]
+            raise
+
+        # Raise RTC and RTR (V.24 signals), some modules hold data until set
+        self._write_frames(
+            [encode_frame(0, UIH, bytes([MSC, 0x05, (dlci << 2) | 0x03, 0x0D]))]
+        )
+        return channel
+
+    def close_channel(self, dlci: int) -> None:
+        if self.channels.pop(dlci, None) is None:
+            return
+        try:
+            self._request(dlci, DISC | PF)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        for dlci in list(self.channels):
+            self.close_channel(dlci)
+        # Close down the multiplexer, the port goes back to AT commands
+        self._write_frames([encode_frame(0, UIH, bytes([CLD, 0x01]))])
+        self.running = False
+        if self.reader is not None:
+            self.reader.join(self.timeout + 1)
+
+    def write_data(self, dlci: int, data: bytes) -> None:
+        frames = []
+        for i in range(0, len(data), self.frame_size):
+            frames.append(encode_frame(dlci, UIH, data[i : i + self.frame_size]))
+        self._write_frames(frames)
+
+    def _connect(self, dlci: int) -> None:
+        if self._request(dlci, SABM | PF) != UA:
+            raise Exception("Channel {} refused".format(dlci))
+
+    def _request(self, dlci: int, control: int) -> int:
+        event = threading.Event()
+        self.responses[dlci] = [event, None]
+        self._write_frames([encode_frame(dlci, control)])
+        if not event.wait(self.timeout):
+            del self.responses[dlci]
+            raise Exception("No response on channel {}".format(dlci))
+        return self.responses.pop(dlci)[1]
+
+    def _write_frames(self, frames: list) -> None:
+        with self.write_lock:
+            self.comm.write_raw(b"".join(frames))
+
+    def _read_reply(self) -> bytes:
+        # Unlike read_lines(), return as soon as the final result arrives
+        read = bytearray()
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            read += self.comm.read_available(64)
+            if read.endswith(b"OK\r\n") or read.endswith(b"ERROR\r\n"):
+                break
+        return bytes(read)
+
+    def _read_frames(self) -> None:
+        while self.running:
+            data = self.comm.read_available(self.decoder.missing())
+            if not data:
+                continue
+            for dlci, control, info in self.decoder.feed(data):
+                self._dispatch(dlci, control & ~PF, info)
+
+    def _dispatch(self, dlci: int, control: int, info: bytes) -> None:
+        if control in (UA, DM):
+            pending = self.responses.get(dlci)
+            if pending is not None:
+                pending[1] = control
+                pending[0].set()
+        elif control == DISC:
+            self.channels.pop(dlci, None)
+            # Response from the initiator: C/R cleared
+            self._write_frames([encode_frame(dlci, UA | PF, cr=0)])
+        elif control == UIH and dlci == 0:
+            # Acknowledge modem status commands by clearing the C/R bit
+            if len(info) >= 2 and info[0] == MSC:
+                self._write_frames(
+                    [encode_frame(0, UIH, bytes([MSC & ~0x02]) + info[1:])]
+                )
+        elif control == UIH and dlci in self.channels:
+            self.channels[dlci].receive(info)
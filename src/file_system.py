@@ -0,0 +1,218 @@
+from sim_modem import Modem
+import os
+import time
+
+
+class FileSystem:
+    """Access to the modem filesystem (AT+FS* commands)"""
+
+    def __init__(self, modem: Modem, chunk_size=10240, input_time=10, retries=3):
+        self.modem = modem
+        # AT+FSWRITE and AT+FSREAD move at most 10240 bytes per command
+        self.chunk_size = chunk_size
+        self.input_time = input_time
+        self.retries = retries
+
+    def list_dir(self, path="C:\\User\\") -> list:
+        self._command("AT+FSCD={}".format(path))
+        read = self._command("AT+FSLS")
+
+        # ['AT+FSLS', '+FSLS: SUBDIRECTORIES:', 'FTP', '', '+FSLS: FILES:', 'prompt.amr', '', 'OK']
+        entries = []
+        is_dir = None
+        for line in read[1:-1]:
+            if line.startswith("+FSLS:"):
+                is_dir = "SUBDIRECTORIES" in line
+            elif line != "" and is_dir is not None:
+                entries.append({"name": line, "is_dir": is_dir})
+        return entries
+
+    def stat(self, path: str) -> dict:
+        read = self._command("AT+FSFLSIZE={}".format(path))
+
+        # ['AT+FSFLSIZE=C:\\User\\prompt.amr', '+FSFLSIZE: 1234', '', 'OK']
+        return {"path": path, "size": int(read[1].split(": ")[1])}
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except Exception:
+            return False
+        return True
+
+    def delete(self, path: str) -> str:
+        read = self._command("AT+FSDEL={}".format(path))
+
+        # ['AT+FSDEL=C:\\User\\prompt.amr', 'OK']
+        return read[-1]
+
+    def upload(self, local_path, remote_path, resume=False, on_progress=None) -> dict:
+        total = os.path.getsize(local_path)
+        if resume and self.exists(remote_path):
+            offset = self.stat(remote_path)["size"]
+        else:
+            if self.exists(remote_path):
+                self.delete(remote_path)
+            self._command("AT+FSCREATE={}".format(remote_path))
+            offset = 0
+        if offset > total:
+            raise Exception("Remote file larger than local file")
+
+        started = time.time()
+        start_offset = offset
+        attempts = 0
+        with open(local_path, "rb") as f:
+            while offset < total:
+                f.seek(offset)
+                data = f.read(self.chunk_size)
+                try:
+                    self._write_chunk(remote_path, data)
+                except Exception:
+                    attempts += 1
+                    if attempts > self.retries:
+                        raise
+                    self._drain()
+                    # The chunk may have been partially written, resume from
+                    # what the modem actually holds
+                    offset = self.stat(remote_path)["size"]
+                    continue
+                attempts = 0
+                offset += len(data)
+                self._progress(on_progress, offset, total, start_offset, started)
+
+        return self._summary(offset, total, start_offset, started)
+
+    def download(self, remote_path, local_path, resume=False, on_progress=None) -> dict:
+        total = self.stat(remote_path)["size"]
+        offset = 0
+        if resume and os.path.exists(local_path):
+            offset = os.path.getsize(local_path)
+        if offset > total:
+            raise Exception("Local file larger than remote file")
+
+        started = time.time()
+        start_offset = offset
+        attempts = 0
+        with open(local_path, "ab" if offset else "wb") as f:
+            while offset < total:
+                size = min(self.chunk_size, total - offset)
+                try:
+                    data = self._read_chunk(remote_path, offset, size)
+                    # 'CONNECT 0', the file shrank after stat()
+                    if not data:
+                        raise Exception("Remote file shorter than expected")
+                except Exception:
+                    attempts += 1
+                    if attempts > self.retries:
+                        raise
+                    self._drain()
+                    continue
+                attempts = 0
+                f.write(data)
+                offset += len(data)
+                self._progress(on_progress, offset, total, start_offset, started)
+
+        return self._summary(offset, total, start_offset, started)
+
+    # ------------------------------------ RAW ----------------------------------- #
+
+    def _write_chunk(self, path: str, data: bytes) -> None:
+        comm = self.modem.comm
+        with comm.lock:
+            # Mode 1 appends to the file, the modem prompts '>' for the data
+            comm.send("AT+FSWRITE={},1,{},{}".format(path, len(data), self.input_time))
+            read = self._read_until((b">", b"ERROR\r\n"))
+            if not read.rstrip(b" ").endswith(b">"):
+                raise Exception("Command failed")
+            comm.send_raw(data)
+            read = self._read_until((b"OK\r\n", b"ERROR\r\n"))
+
+        if not read.endswith(b"OK\r\n"):
+            raise Exception("Command failed")
+
+    def _read_chunk(self, path: str, offset: int, size: int) -> bytes:
+        comm = self.modem.comm
+        with comm.lock:
+            # Mode 1 reads `size` bytes from `offset`
+            comm.send("AT+FSREAD={},1,{},{}".format(path, size, offset))
+
+            # b'AT+FSREAD=C:\\User\\log.txt,1,10240,0\r\r\n\r\nCONNECT 10240\r\n' + data + b'\r\nOK\r\n'
+            while True:
+                line = self._read_line()
+                if line.startswith(b"CONNECT"):
+                    break
+                if b"ERROR" in line:
+                    raise Exception("Command failed")
+            length = line.split(b" ")
+            # The data may contain anything, including 'OK': read it by size
+            data = self._read_exactly(int(length[1]) if len(length) > 1 else size)
+            read = self._read_exactly(6)
+
+        if read != b"\r\nOK\r\n":
+            raise Exception("Command failed")
+        return data
+
+    def _read_line(self) -> bytes:
+        read = bytearray()
+        while not read.endswith(b"\n"):
+            data = self.modem.comm.read_raw(1)
+            if not data:
+                raise Exception("Transfer timed out")
+            read += data
+        return bytes(read).strip()
+
+    def _read_exactly(self, size: int) -> bytes:
+        read = bytearray()
+        while len(read) < size:
+            data = self.modem.comm.read_raw(size - len(read))
+            if not data:
+                raise Exception("Transfer timed out")
+            read += data
+        return bytes(read)
+
+    def _read_until(self, terminators: tuple) -> bytes:
+        # Byte by byte up to the terminator, so the port timeout is never
+        # waited on a short read
+        read = bytearray()
+        while True:
+            data = self.modem.comm.read_raw(1)
+            if not data:
+                raise Exception("Transfer timed out")
+            read += data
+            if any(read.rstrip(b" ").endswith(x) for x in terminators):
+                return bytes(read)
+
+    def _drain(self) -> None:
+        # Discard the leftovers of a failed exchange
+        self.modem.comm.read_lines()
+
+    def _command(self, cmd: str) -> list:
+        if self.modem.debug:
+            print("Sending: {}".format(cmd))
+
+        self.modem.comm.send(cmd)
+        read = self.modem.comm.read_lines()
+
+        if self.modem.debug:
+            print("Device responded: ", read)
+
+        if read[-1] != "OK":
+            raise Exception("Command failed")
+        return read
+
+    @staticmethod
+    def _progress(on_progress, offset, total, start_offset, started) -> None:
+        if on_progress is None:
+            return
+        elapsed = max(time.time() - started, 1e-6)
+        on_progress(offset, total, (offset - start_offset) / elapsed / 1000000)
+
+    @staticmethod
+    def _summary(offset, total, start_offset, started) -> dict:
+        elapsed = max(time.time() - started, 1e-6)
+        return {
+            "bytes": offset - start_offset,
+            "total": total,
+            "seconds": elapsed,
+            "mb_per_s": (offset - start_offset) / elapsed / 1000000,
+        }
@@ -1,4 +1,5 @@
 import serial
+import threading
 import time
 
 
@@ -15,6 +16,9 @@ class SerialComm:
         self.at_cmd_delay = at_cmd_delay
         self.on_error = on_error
         self.byte_encoding = byte_encoding
+        # Held by long running exchanges (e.g. operator scans) so that other
+        # threads do not interleave commands on the port
+        self.lock = threading.RLock()
         self.modem_serial = serial.Serial(
             port=address,
             baudrate=baudrate,
@@ -22,21 +26,34 @@ class SerialComm:
         )
 
     def send(self, cmd) -> str or None:
-        self.modem_serial.write(cmd.encode(self.byte_encoding) + b"\r")
-        time.sleep(self.at_cmd_delay)
+        with self.lock:
+            self.modem_serial.write(cmd.encode(self.byte_encoding) + b"\r")
+            time.sleep(self.at_cmd_delay)
 
     def send_raw(self, cmd):
-        self.modem_serial.write(cmd)
-        time.sleep(self.at_cmd_delay)
+        with self.lock:
+            self.modem_serial.write(cmd)
+            time.sleep(self.at_cmd_delay)
 
     def read_lines(self) -> list:
-        read = self.modem_serial.readlines()
+        with self.lock:
+            read = self.modem_serial.readlines()
         for i, line in enumerate(read):
             read[i] = line.decode(self.byte_encoding).strip()
         return read
 
     def read_raw(self, size: int):
-        return self.modem_serial.read(size)
+        with self.lock:
+            return self.modem_serial.read(size)
+
+    # Lock free access for the single owner of the port (e.g. Cmux): writes
+    # do not wait for a blocking read, reads return what is available
+    def write_raw(self, data):
+        self.modem_serial.write(data)
+
+    def read_available(self, size: int):
+        waiting = self.modem_serial.in_waiting
+        return self.modem_serial.read(min(size, waiting) if waiting else 1)
 
     def close(self):
         self.modem_serial.close()
@@ -0,0 +1,241 @@
+from sim_modem import Modem, SignalQuality
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+import threading
+import time
+
+
+class SignalTelemetry:
+    """Signal quality samples with rolling aggregates over the last `capacity` samples"""
+
+    def __init__(
+        self,
+        modem: Modem,
+        capacity=720,
+        interval=5,
+        thresholds=(),
+        on_event=None,
+        comm=None,
+    ):
+        self.modem = modem
+        # Dedicated comm (e.g. a CmuxChannel) for the periodic reports: they
+        # are read line by line, which on the modem comm would eat the
+        # replies of other commands. Without it AT+CSQ is polled
+        self.comm = comm
+        self.capacity = capacity
+        self.interval = interval
+        self.thresholds = sorted(thresholds)
+        self.on_event = on_event
+        self.mode = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+        # Ring buffer of samples, dBm values and their timestamps
+        self.timestamps = array("d", [0.0] * capacity)
+        self.values = array("h", [0] * capacity)
+        self.count = 0
+        self.added = 0
+        self.total = 0
+        # Aggregates kept up to date on each sample: sorted window for the
+        # percentiles, monotonic queues of (sample number, dBm) for min/max
+        self.sorted = []
+        self.min_queue = deque()
+        self.max_queue = deque()
+
+        self.quality = None
+        self.transitions = 0
+        self.unknown = 0
+
+    # ---------------------------------- SAMPLING -------------------------------- #
+
+    def start(self) -> str:
+        # Prefer the modem periodic reports (+CSQ every 5 seconds), poll
+        # AT+CSQ when there is no dedicated comm or they are not supported
+        self.mode = "poll"
+        if self.comm is not None:
+            self.comm.send("AT+AUTOCSQ=1,0")
+            read = self.comm.read_lines()
+
+            # ['AT+AUTOCSQ=1,0', 'OK']
+            if self.modem.debug:
+                print("Device responded: ", read)
+
+            if read and read[-1] == "OK":
+                self.mode = "auto"
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.mode
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.mode == "auto":
+            self.comm.send("AT+AUTOCSQ=0")
+            self.comm.read_lines()
+        self.mode = None
+
+    def feed(self, line: str) -> bool:
+        # '+CSQ: 19,99'
+        if not line.startswith("+CSQ:"):
+            return False
+        self.add_sample(int(line.split(": ")[1].split(",")[0]))
+        return True
+
+    def add_sample(self, rssi: int, timestamp=None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+
+        # 99 means not known or not detectable, it is not a signal level
+        if rssi == 99:
+            with self.lock:
+                self.unknown += 1
+            self._emit({"type": "unknown", "timestamp": timestamp})
+            return
+
+        dbm = -(111 - (2 * rssi))
+        quality = self._quality(rssi)
+        with self.lock:
+            previous = self.last()
+            self._push(dbm, timestamp)
+            previous_quality = self.quality
+            self.quality = quality
+            if previous_quality is not None and previous_quality != quality:
+                self.transitions += 1
+
+        if previous_quality is not None and previous_quality != quality:
+            self._emit(
+                {
+                    "type": "quality",
+                    "from": previous_quality,
+                    "to": quality,
+                    "dbm": dbm,
+                    "timestamp": timestamp,
+                }
+            )
+        if previous is None:
+            return
+        for threshold in self.thresholds:
+            if (previous["dbm"] < threshold) != (dbm < threshold):
+                self._emit(
+                    {
+                        "type": "threshold",
+                        "threshold": threshold,
+                        "direction": "below" if dbm < threshold else "above",
+                        "dbm": dbm,
+                        "timestamp": timestamp,
+                    }
+                )
+
+    # --------------------------------- AGGREGATES ------------------------------- #
+
+    def last(self) -> dict or None:
+        if self.count == 0:
+            return None
+        i = (self.added - 1) % self.capacity
+        return {"timestamp": self.timestamps[i], "dbm": self.values[i]}
+
+    def samples(self) -> list:
+        with self.lock:
+            first = self.added - self.count
+            return [
+                {
+                    "timestamp": self.timestamps[n % self.capacity],
+                    "dbm": self.values[n % self.capacity],
+                }
+                for n in range(first, self.added)
+            ]
+
+    def percentile(self, p: float) -> int or None:
+        with self.lock:
+            return self._percentile(p)
+
+    def stats(self) -> dict:
+        # Everything from the same window
+        with self.lock:
+            empty = self.count == 0
+            return {
+                "count": self.count,
+                "unknown": self.unknown,
+                "min": None if empty else self.min_queue[0][1],
+                "max": None if empty else self.max_queue[0][1],
+                "mean": None if empty else self.total / self.count,
+                "p50": self._percentile(50),
+                "p90": self._percentile(90),
+                "p95": self._percentile(95),
+                "quality": self.quality,
+                "transitions": self.transitions,
+            }
+
+    def _percentile(self, p: float) -> int or None:
+        if p < 0 or p > 100:
+            raise Exception("Percentile must be between 0 and 100")
+        if self.count == 0:
+            return None
+        # Nearest rank
+        rank = max(1, -(-p * self.count // 100))
+        return self.sorted[int(rank) - 1]
+
+    def _push(self, dbm: int, timestamp: float) -> None:
+        i = self.added % self.capacity
+        if self.count == self.capacity:
+            # Evict the oldest sample, which sits in the slot being reused
+            evicted = self.added - self.capacity
+            old = self.values[i]
+            self.total -= old
+            del self.sorted[bisect_left(self.sorted, old)]
+            if self.min_queue[0][0] == evicted:
+                self.min_queue.popleft()
+            if self.max_queue[0][0] == evicted:
+                self.max_queue.popleft()
+        else:
+            self.count += 1
+
+        self.timestamps[i] = timestamp
+        self.values[i] = dbm
+        self.total += dbm
+        insort(self.sorted, dbm)
+        while self.min_queue and self.min_queue[-1][1] >= dbm:
+            self.min_queue.pop()
+        self.min_queue.append((self.added, dbm))
+        while self.max_queue and self.max_queue[-1][1] <= dbm:
+            self.max_queue.pop()
+        self.max_queue.append((self.added, dbm))
+        self.added += 1
+
+    def _run(self) -> None:
+        while self.running:
+            try:
+                if self.mode == "auto":
+                    for line in self.comm.read_lines():
+                        self.feed(line)
+                else:
+                    # One command per interval, not interleaved with the
+                    # exchanges of other lock holders
+                    with self.modem.comm.lock:
+                        rssi = self.modem.get_signal_quality()
+                    self.feed("+CSQ: " + rssi)
+                    time.sleep(self.interval)
+            except Exception as e:
+                self._emit({"type": "error", "error": e, "timestamp": time.time()})
+                time.sleep(self.interval)
+
+    def _emit(self, event: dict) -> None:
+        if self.on_event is not None:
+            self.on_event(event)
+
+    @staticmethod
+    def _quality(rssi: int) -> SignalQuality:
+        # Same ranges of Modem.get_signal_quality_range()
+        if rssi < 7:
+            return SignalQuality.LOW
+        elif rssi < 15:
+            return SignalQuality.FAIR
+        elif rssi < 20:
+            return SignalQuality.GOOD
+        else:
+            return SignalQuality.EXCELLENT
@@ -1,6 +1,9 @@
 from serial_comm import SerialComm
 from enum import Enum
 from logging import getLogger
+import re
+import threading
+import time
 
 
 class NetworkMode(Enum):
@@ -21,6 +24,45 @@ class SignalQuality(Enum):
     EXCELLENT = "EXCELLENT"
 
 
+class OperatorStatus(Enum):
+    """Availability of an operator found by a network scan"""
+
+    UNKNOWN = 0
+    AVAILABLE = 1
+    CURRENT = 2
+    FORBIDDEN = 3
+
+
+class OperatorScan:
+    """Handle of a background operator scan (AT+COPS=?)"""
+
+    def __init__(self, on_operator=None):
+        self.on_operator = on_operator
+        self.operators = []
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout=None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None) -> list:
+        if not self._done.wait(timeout):
+            raise Exception("Operator scan still running")
+        if self.error is not None:
+            raise self.error
+        return self.operators
+
+    def age(self) -> float or None:
+        if self.finished_at is None:
+            return None
+        return time.time() - self.finished_at
+
+
 class Modem:
     """Class for interfacing with mobile modem"""
 
@@ -31,14 +73,21 @@ class Modem:
         timeout=5,
         at_cmd_delay=0.1,
         debug=False,
+        comm=None,
     ):
-        self.comm = SerialComm(
-            address=address,
-            baudrate=baudrate,
-            timeout=timeout,
-            at_cmd_delay=at_cmd_delay,
-        )
+        # An existing comm (e.g. a CmuxChannel) can be used instead of the port
+        if comm is not None:
+            self.comm = comm
+        else:
+            self.comm = SerialComm(
+                address=address,
+                baudrate=baudrate,
+                timeout=timeout,
+                at_cmd_delay=at_cmd_delay,
+            )
         self.debug = debug
+        self.operator_scan = None
+        self.last_operator_scan = None
 
         self.comm.send("ATZ")
         self.comm.send("ATE1")
@@ -341,6 +390,138 @@ class Modem:
             raise Exception("Command failed")
         return read[1].split(",")[2].strip('"').split(" ")[0]
 
+    def get_serving_cell(self) -> dict:
+        if self.debug:
+            self.comm.send("AT+CPSI=?")
+            read = self.comm.read_lines()
+            if read[-1] != "OK":
+                raise Exception("Unsupported command")
+            print("Sending: AT+CPSI?")
+
+        self.comm.send("AT+CPSI?")
+        read = self.comm.read_lines()
+
+        # +CPSI: [RAT],[mode],[MCC-MNC],[TAC],[cell ID],[PCI],[band],[EARFCN],[DL bw],[UL bw],[RSRQ],[RSRP],[RSSI],[RSSNR]
+        # ['AT+CPSI?', '+CPSI: LTE,Online,262-02,0x6B5C,27447297,216,EUTRAN-BAND3,1300,5,5,-94,-1037,-752,14', '', 'OK']
+        # ['AT+CPSI?', '+CPSI: GSM,Online,262-02,0x6B5C,12401,27 EGSM 900,-64,2110,42-42', '', 'OK']
+        # ['AT+CPSI?', '+CPSI: NO SERVICE,Online', '', 'OK']
+        if self.debug:
+            print("Device responded: ", read)
+
+        if read[-1] != "OK":
+            raise Exception("Command failed")
+        fields = read[1].split(": ")[1].split(",")
+        cell = {
+            "rat": fields[0],
+            "operation_mode": fields[1],
+            "mcc_mnc": None,
+            "cell_id": None,
+            "band": None,
+            "rsrp": None,
+            "rsrq": None,
+            "sinr": None,
+        }
+        # LTE, LTE CAT-M1 or LTE NB-IOT
+        if fields[0].startswith("LTE") and len(fields) >= 14:
+            # RSRQ and RSRP are reported in 1/10 dB, SINR = 2 * RSSNR - 20
+            cell["mcc_mnc"] = fields[2]
+            cell["cell_id"] = fields[4]
+            cell["band"] = fields[6]
+            cell["rsrq"] = int(fields[10]) / 10
+            cell["rsrp"] = int(fields[11]) / 10
+            cell["sinr"] = 2 * int(fields[13]) - 20
+        elif len(fields) >= 6:
+            cell["mcc_mnc"] = fields[2]
+            cell["cell_id"] = fields[4]
+            # GSM prefixes the band with the ARFCN: '27 EGSM 900'
+            arfcn, _, band = fields[5].partition(" ")
+            cell["band"] = band if arfcn.isdigit() and band else fields[5]
+        return cell
+
+    def start_operator_scan(self, scan_timeout=180, on_operator=None) -> OperatorScan:
+        # A full scan takes minutes: run it in background and hand back a
+        # handle, joining the running scan instead of starting a second one
+        if self.operator_scan is not None and not self.operator_scan.done():
+            return self.operator_scan
+
+        scan = OperatorScan(on_operator=on_operator)
+        self.operator_scan = scan
+        thread = threading.Thread(
+            target=self._run_operator_scan,
+            args=(scan, scan_timeout),
+            daemon=True,
+        )
+        thread.start()
+        return scan
+
+    def get_scanned_operators(self, max_age=None) -> list or None:
+        scan = self.last_operator_scan
+        if scan is None:
+            return None
+        if max_age is not None and scan.age() > max_age:
+            return None
+        return scan.operators
+
+    def _run_operator_scan(self, scan: OperatorScan, scan_timeout) -> None:
+        try:
+            # Keep the port for the whole scan, so no other command is sent
+            # while it runs. The lock does not cover the exchanges of other
+            # threads: a reply pending when the scan starts is read by it
+            with self.comm.lock:
+                if self.debug:
+                    print("Sending: AT+COPS=?")
+
+                self.comm.send("AT+COPS=?")
+                read = []
+                deadline = time.time() + scan_timeout
+                while time.time() < deadline:
+                    lines = self.comm.read_lines()
+                    read += lines
+                    for line in lines:
+                        if not line.startswith("+COPS:"):
+                            continue
+                        for operator in self._parse_operators(line):
+                            scan.operators.append(operator)
+                            if scan.on_operator is not None:
+                                scan.on_operator(operator)
+                    if "OK" in lines or any("ERROR" in x for x in lines):
+                        break
+
+            # ['AT+COPS=?', '+COPS: (2,"Vodafone D2","Vodafone","26202",7),(1,"Telekom.de","TDG","26201",7),,(0-4),(0-2)', '', 'OK']
+            if self.debug:
+                print("Device responded: ", read)
+
+            if "OK" not in read:
+                if any("ERROR" in x for x in read):
+                    raise Exception("Command failed")
+                raise Exception("Operator scan timed out")
+            # Publish the scan only once its age can be computed
+            scan.finished_at = time.time()
+            self.last_operator_scan = scan
+        except Exception as e:
+            scan.error = e
+        finally:
+            if scan.finished_at is None:
+                scan.finished_at = time.time()
+            scan._done.set()
+
+    @staticmethod
+    def _parse_operators(line: str) -> list:
+        operators = []
+        for match in re.finditer(
+            r'\((\d),"([^"]*)","([^"]*)","([^"]*)"(?:,(\d+))?\)', line
+        ):
+            operators.append(
+                {
+                    "status": OperatorStatus(int(match.group(1))),
+                    "long_name": match.group(2),
+                    "short_name": match.group(3),
+                    "numeric": match.group(4),
+                    "act": int(match.group(5)) if match.group(5) else None,
+                }
+            )
+        return operators
+
     def get_signal_quality(self) -> str:
         if self.debug:
             self.comm.send("AT+CSQ=?")
@@ -559,30 +740,34 @@ class Modem:
         self.comm.send('AT+CMGL="ALL"')
 
         read = self.comm.read_lines()
-        sms_lines = [x for x in read if x != ""]  # remove empty lines
-        sms_lines = sms_lines[5 : len(sms_lines) - 1]  # remove command and OK
-        tuple_list = [
-            tuple(sms_lines[i : i + 2]) for i in range(0, len(sms_lines), 2)
-        ]  # group sms info with message
 
-        sms_list = []
-        for i in tuple_list:
-            sms_list.append(
-                {
-                    "index": i[0].split(":")[1].split(",")[0].strip(),
-                    "number": i[0].split('READ","')[1].split('","","')[0],
-                    "date": i[0].split('","","')[1].split(",")[0],
-                    "time": i[0].split(",")[5].split("+")[0],
-                    "message": i[1].replace("\r\n", "").strip(),
-                }
-            )
-
-        # ['AT+CMGL="ALL"', '+CMGL: 1,"REC READ","+491234567890",,"12/08/14,14:01:06+32"', 'Test', '', 'OK']
+        # ['AT+CMGF=1', 'OK', 'AT+CMGL="ALL"', '+CMGL: 1,"REC READ","+491234567890","","12/08/14,14:01:06+32"', 'Test', '', 'OK']
         if self.debug:
             print("Device responded: ", read)
 
         if read[-1] != "OK":
             raise Exception("Command failed")
+
+        # '+CMGL: 2,"STO UNSENT","+491234567890",""' Stored drafts have no
+        # timestamp and are skipped
+        sms_list = []
+        for header, message in self._parse_sms(read, "+CMGL:"):
+            match = re.match(
+                r'\+CMGL: (\d+),"([^"]*)","([^"]*)",(?:"[^"]*")?,"([^,]*),([^+-]*)',
+                header,
+            )
+            if match is None:
+                continue
+            sms_list.append(
+                {
+                    "index": match.group(1),
+                    "status": match.group(2),
+                    "number": match.group(3),
+                    "date": match.group(4),
+                    "time": match.group(5),
+                    "message": message,
+                }
+            )
         return sms_list
 
     def empty_sms(self) -> str:
@@ -644,21 +829,44 @@ class Modem:
         self.comm.send("AT+CMGR={}".format(slot))
         read = self.comm.read_lines()
 
-        # ['AT+CMGF=1', 'OK', 'AT+CMGR=1', '+CMGR: "REC READ","+491234567890",,"12/08/14,14:01:06+32"', 'Test', '', 'OK']
-        # ['AT+CMGF=1', 'OK'] # if empty
+        # ['AT+CMGF=1', 'OK', 'AT+CMGR=1', '+CMGR: "REC READ","+491234567890","","12/08/14,14:01:06+32"', 'Test', '', 'OK']
+        # ['AT+CMGF=1', 'OK', 'AT+CMGR=1', 'OK'] # if empty
         if self.debug:
             print("Device responded: ", read)
 
-        if len(read) < 3 or read[-1] != "OK":
+        if len(read) == 0 or read[-1] != "OK":
+            raise Exception("Command failed")
+        sms = self._parse_sms(read, "+CMGR:")
+        if len(sms) == 0:
+            raise Exception("Command failed")
+        header, message = sms[0]
+        match = re.match(
+            r'\+CMGR: "([^"]*)","([^"]*)",(?:"[^"]*")?,"([^,]*),([^+-]*)', header
+        )
+        # Stored drafts have no timestamp
+        if match is None:
             raise Exception("Command failed")
         return {
-            "slot": read[1].split(":")[1].split(",")[0].strip(),
-            "number": read[1].split('READ","')[1].split('","","')[0],
-            "date": read[1].split('","","')[1].split(",")[0],
-            "time": read[1].split(",")[5].split("+")[0],
-            "message": read[4].replace("\r\n", "").strip(),
+            "slot": str(slot),
+            "status": match.group(1),
+            "number": match.group(2),
+            "date": match.group(3),
+            "time": match.group(4),
+            "message": message,
         }
 
+    @staticmethod
+    def _parse_sms(read: list, prefix: str) -> list:
+        # Pair each header line with the text lines up to the next header,
+        # the final OK is not part of the last message
+        sms = []
+        for line in read[:-1]:
+            if line.startswith(prefix):
+                sms.append((line, []))
+            elif len(sms) > 0:
+                sms[-1][1].append(line)
+        return [(header, "\n".join(text).strip()) for header, text in sms]
+
     def delete_sms(self, slot: int) -> str:
         if self.debug:
             self.comm.send("AT+CMGF=?")
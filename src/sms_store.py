@@ -0,0 +1,196 @@
+from sim_modem import Modem
+from datetime import datetime
+import sqlite3
+
+
+class SmsStore:
+    """Local SQLite mirror of the modem SMS storage"""
+
+    def __init__(self, modem: Modem, path="sms.db", free_slots=True, comm=None):
+        self.modem = modem
+        self.free_slots = free_slots
+        # Dedicated comm (e.g. a CmuxChannel) carrying the +CMTI notifications,
+        # reading them from the modem comm would eat the replies of commands
+        self.comm = comm
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sms (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                number TEXT NOT NULL,
+                received_at TEXT NOT NULL,
+                message TEXT NOT NULL,
+                stored_at TEXT NOT NULL,
+                UNIQUE (number, received_at, message)
+            );
+            CREATE INDEX IF NOT EXISTS sms_number ON sms (number, received_at);
+            CREATE INDEX IF NOT EXISTS sms_received_at ON sms (received_at);
+            """)
+        self.fts = self._create_text_index()
+        self.db.commit()
+
+    def _create_text_index(self) -> bool:
+        # Full text index kept in sync by triggers, a plain LIKE (full table
+        # scan) is used when SQLite is built without FTS5
+        created = (
+            self.db.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sms_text'"
+            ).fetchone()[0]
+            == 0
+        )
+        try:
+            self.db.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS sms_text
+                    USING fts5(message, content='sms', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS sms_text_insert AFTER INSERT ON sms
+                BEGIN
+                    INSERT INTO sms_text (rowid, message) VALUES (new.id, new.message);
+                END;
+                CREATE TRIGGER IF NOT EXISTS sms_text_delete AFTER DELETE ON sms
+                BEGIN
+                    INSERT INTO sms_text (sms_text, rowid, message)
+                        VALUES ('delete', old.id, old.message);
+                END;
+                """)
+        except sqlite3.OperationalError:
+            return False
+        if created:
+            # Index the messages stored before the index existed
+            self.db.execute("INSERT INTO sms_text (sms_text) VALUES ('rebuild')")
+        return True
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ----------------------------------- SYNC ----------------------------------- #
+
+    def enable_notifications(self) -> str:
+        # +CMTI: "SM",<slot> is sent for each new message stored on the modem
+        comm = self.comm if self.comm is not None else self.modem.comm
+        comm.send("AT+CNMI=2,1")
+        read = comm.read_lines()
+
+        # ['AT+CNMI=2,1', 'OK']
+        if self.modem.debug:
+            print("Device responded: ", read)
+
+        if read[-1] != "OK":
+            raise Exception("Command failed")
+        return read[1]
+
+    def sync(self) -> int:
+        # Slot scan: pulls whatever is on the modem, including messages whose
+        # +CMTI notification was consumed by another command
+        stored = 0
+        for sms in self.modem.get_sms_list():
+            # Only received messages, sent and unsent ones stay on the modem
+            if sms["status"] in ("REC UNREAD", "REC READ"):
+                stored += self._store(sms, sms["index"])
+        return stored
+
+    def sync_slot(self, slot) -> int:
+        sms = self.modem.get_sms(slot)
+        if sms["status"] not in ("REC UNREAD", "REC READ"):
+            return 0
+        return self._store(sms, slot)
+
+    def handle_line(self, line: str) -> int:
+        # '+CMTI: "SM",3'
+        if not line.startswith("+CMTI:"):
+            return 0
+        return self.sync_slot(int(line.split(",")[-1]))
+
+    def poll(self) -> int:
+        # Without a dedicated comm fall back to a slot scan: a single command
+        # instead of reading lines that may belong to other commands
+        if self.comm is None:
+            return self.sync()
+
+        # Read pending notifications, only new slots are fetched
+        stored = 0
+        for line in self.comm.read_lines():
+            stored += self.handle_line(line)
+        return stored
+
+    def _store(self, sms: dict, slot) -> int:
+        # '12/08/14' '14:01:06' -> '2012-08-14 14:01:06'
+        received_at = "20{} {}".format(sms["date"].replace("/", "-"), sms["time"])
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO sms (number, received_at, message, stored_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                sms["number"],
+                received_at,
+                sms["message"],
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            ),
+        )
+        self.db.commit()
+
+        # Free the slot only once the message is safely on disk
+        if self.free_slots:
+            self.modem.delete_sms(slot)
+        return cursor.rowcount
+
+    # ---------------------------------- QUERIES --------------------------------- #
+
+    def find(
+        self,
+        number=None,
+        since=None,
+        until=None,
+        text=None,
+        limit=None,
+    ) -> list:
+        where = []
+        params = []
+        if number is not None:
+            where.append("number = ?")
+            params.append(number)
+        if since is not None:
+            where.append("received_at >= ?")
+            params.append(self._timestamp(since))
+        if until is not None:
+            where.append("received_at < ?")
+            params.append(self._timestamp(until))
+        if text is not None and self.fts:
+            # Words of `text` as a phrase, quoted to disable the FTS syntax
+            where.append("id IN (SELECT rowid FROM sms_text WHERE sms_text MATCH ?)")
+            params.append('"{}"'.format(text.replace('"', '""')))
+        elif text is not None:
+            where.append("message LIKE ? ESCAPE '\\'")
+            params.append(
+                "%{}%".format(
+                    text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                )
+            )
+
+        query = "SELECT id, number, received_at, message FROM sms"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY received_at"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        return [
+            {
+                "id": row[0],
+                "number": row[1],
+                "received_at": row[2],
+                "message": row[3],
+            }
+            for row in self.db.execute(query, params)
+        ]
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sms").fetchone()[0]
+
+    def delete(self, id: int) -> None:
+        self.db.execute("DELETE FROM sms WHERE id = ?", (id,))
+        self.db.commit()
+
+    @staticmethod
+    def _timestamp(value) -> str:
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)
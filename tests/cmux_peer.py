@@ -0,0 +1,110 @@
+import threading
+from cmux import CLD, DISC, MSC, PF, SABM, UA, UIH, FrameDecoder, encode_frame
+
+
+class CmuxPeer:
+    """Modem side of a CMUX session over an in-memory port
+
+    Answers AT+CMUX, SABM and DISC with UA, MSC commands with their response
+    and each AT command of a channel with its echo and OK. Replies are split
+    into `frame_size` frames sent back to back, sharing their flags.
+    """
+
+    def __init__(self, frame_size=31, delays=None):
+        self.frame_size = frame_size
+        # Seconds to wait before answering a command, by command
+        self.delays = delays or {}
+        self.decoder = FrameDecoder()
+        self.muxed = False
+        self.output = bytearray()
+        self.available = threading.Condition()
+        self.commands = {}
+        self.frames = []
+        self.written = bytearray()
+
+    # Port interface used by Cmux
+
+    def write_raw(self, data):
+        self.written += data
+        if not self.muxed:
+            cmd = data.rstrip(b"\r")
+            self.muxed = cmd.startswith(b"AT+CMUX")
+            self._output(cmd + b"\r\r\nOK\r\n" if self.muxed else b"ERROR\r\n")
+            return
+
+        for dlci, control, info in self.decoder.feed(data):
+            self.frames.append((dlci, control & ~PF, info))
+            self._answer(dlci, control & ~PF, info)
+
+    def read_available(self, size):
+        with self.available:
+            self.available.wait_for(lambda: len(self.output) > 0, 0.1)
+            data = bytes(self.output[:size])
+            del self.output[:size]
+        return data
+
+    # Modem initiated frames
+
+    def send_frame(self, frame: bytes) -> None:
+        self._output(frame)
+
+    def _answer(self, dlci, control, info):
+        if control in (SABM, DISC):
+            self._output(encode_frame(dlci, UA | PF))
+        elif control == UIH and dlci == 0 and len(info) > 0:
+            if info[0] == MSC:
+                self._output(encode_frame(0, UIH, bytes([MSC & ~0x02]) + info[1:]))
+            elif info[0] == CLD:
+                self._output(encode_frame(0, UIH, bytes([CLD & ~0x02]) + info[1:]))
+                self.muxed = False
+        elif control == UIH:
+            pending = self.commands.get(dlci, b"") + info
+            *commands, self.commands[dlci] = pending.split(b"\r")
+            for cmd in commands:
+                reply = cmd + b"\r\r\nOK\r\n"
+                delay = self.delays.get(cmd.decode(), 0)
+                if delay:
+                    threading.Timer(delay, self._reply, (dlci, reply)).start()
+                else:
+                    self._reply(dlci, reply)
+
+    def _reply(self, dlci, data):
+        frames = [
+            encode_frame(dlci, UIH, data[i : i + self.frame_size])
+            for i in range(0, len(data), self.frame_size)
+        ]
+        # The closing flag of a frame is the opening flag of the next one
+        self._output(frames[0] + b"".join(x[1:] for x in frames[1:]))
+
+    def _output(self, data):
+        with self.available:
+            self.output += data
+            self.available.notify_all()
+
+
+class CmuxPeerSerial:
+    """serial.Serial look-alike connected to a CmuxPeer, blocking reads"""
+
+    def __init__(self, port=None, baudrate=None, timeout=None):
+        self.peer = CmuxPeer()
+        self.timeout = timeout
+
+    @property
+    def in_waiting(self):
+        return len(self.peer.output)
+
+    def write(self, data):
+        self.peer.write_raw(data)
+
+    def read(self, size=1):
+        # Like pyserial: wait up to `timeout` for `size` bytes
+        with self.peer.available:
+            self.peer.available.wait_for(
+                lambda: len(self.peer.output) >= size, self.timeout
+            )
+            data = bytes(self.peer.output[:size])
+            del self.peer.output[:size]
+        return data
+
+    def close(self):
+        pass
@@ -0,0 +1,66 @@
+import pytest
+import serial_comm
+
+
+class FakeSerial:
+    """In-memory serial port answering AT commands with echo (ATE1)"""
+
+    # Command -> reply lines, or a callable returning them. A reply ending
+    # with '>' prompts for data: the next write is passed to the callable
+    # in data_replies for the same command, which returns the reply lines
+    replies = {}
+    data_replies = {}
+
+    def __init__(self, port=None, baudrate=None, timeout=None):
+        self.timeout = timeout
+        self.output = bytearray()
+        self.written = []
+        self.prompted = None
+
+    @property
+    def in_waiting(self):
+        return len(self.output)
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self.prompted is not None:
+            # Raw data after the prompt, no echo
+            reply = self.data_replies.get(self.prompted, lambda x: ["", "OK"])(data)
+            self.prompted = None
+            self.output += self._lines(reply)
+            return
+
+        cmd = data.rstrip(b"\r").decode("ISO-8859-1")
+        reply = self.replies.get(cmd, ["OK"])
+        if callable(reply):
+            reply = reply()
+        if reply and reply[-1] == ">":
+            self.prompted = cmd
+            self.output += self._lines([cmd] + reply[:-1]) + b"> "
+            return
+        self.output += self._lines([cmd] + reply)
+
+    @staticmethod
+    def _lines(lines):
+        return b"".join(x.encode("ISO-8859-1") + b"\r\n" for x in lines)
+
+    def readlines(self):
+        lines = self.output.split(b"\n")
+        self.output.clear()
+        return [x + b"\n" for x in lines[:-1]]
+
+    def read(self, size=1):
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_serial(monkeypatch):
+    FakeSerial.replies = {}
+    FakeSerial.data_replies = {}
+    monkeypatch.setattr(serial_comm.serial, "Serial", FakeSerial)
+    return FakeSerial
@@ -0,0 +1,177 @@
+import threading
+import time
+from cmux import (
+    DISC,
+    PF,
+    SABM,
+    UA,
+    UIH,
+    Cmux,
+    FrameDecoder,
+    encode_frame,
+    fcs,
+)
+from cmux_peer import CmuxPeer, CmuxPeerSerial
+from serial_comm import SerialComm
+import serial_comm
+from sim_modem import Modem
+
+
+def test_fcs_vectors():
+    # Frames of the 27.010 start up and close down sequences
+    assert encode_frame(0, SABM | PF) == bytes.fromhex("f9033f011cf9")
+    assert encode_frame(0, UA | PF) == bytes.fromhex("f9037301d7f9")
+    assert encode_frame(0, DISC | PF) == bytes.fromhex("f9035301fdf9")
+    assert fcs(bytes.fromhex("033f01")) == 0x1C
+
+
+def test_one_byte_length():
+    frame = encode_frame(1, UIH, b"A" * 127)
+
+    assert frame[3] == (127 << 1) | 0x01
+    assert FrameDecoder().feed(frame) == [(1, UIH, b"A" * 127)]
+
+
+def test_two_bytes_length():
+    for size in (128, 300, 1500):
+        data = bytes(range(256)) * 6
+        frame = encode_frame(2, UIH, data[:size])
+
+        assert frame[3] & 0x01 == 0
+        assert frame[3] >> 1 | frame[4] << 7 == size
+        assert FrameDecoder().feed(frame) == [(2, UIH, data[:size])]
+
+
+def test_back_to_back_frames_share_flag():
+    first = encode_frame(1, UIH, b"AT\r")
+    second = encode_frame(2, UIH, b"X" * 200)
+    stream = b"\x00junk" + first + second[1:] + encode_frame(0, SABM | PF)
+
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(len(stream)):
+        frames += decoder.feed(stream[i : i + 1])
+
+    assert frames == [(1, UIH, b"AT\r"), (2, UIH, b"X" * 200), (0, SABM | PF, b"")]
+
+
+def test_bad_fcs_is_dropped():
+    bad = bytearray(encode_frame(1, UIH, b"lost"))
+    bad[-2] ^= 0xFF
+
+    frames = FrameDecoder().feed(bytes(bad) + encode_frame(1, UIH, b"kept"))
+
+    assert frames == [(1, UIH, b"kept")]
+
+
+def test_missing_bytes():
+    decoder = FrameDecoder()
+    frame = encode_frame(1, UIH, b"12345")
+
+    assert decoder.missing() == 1
+    decoder.feed(frame[:4])
+    assert decoder.missing() == len(frame) - 4
+
+
+def test_start_and_open_do_not_wait_for_timeouts():
+    peer = CmuxPeer()
+    mux = Cmux(peer)
+
+    started = time.time()
+    mux.start()
+    mux.open_channel(1, at_cmd_delay=0)
+    elapsed = time.time() - started
+    mux.close()
+
+    assert elapsed < 1
+    assert (0, SABM, b"") in peer.frames
+    assert (1, SABM, b"") in peer.frames
+
+
+def test_serial_comm_writes_do_not_wait_for_reader(monkeypatch):
+    monkeypatch.setattr(serial_comm.serial, "Serial", CmuxPeerSerial)
+    mux = Cmux(SerialComm("/dev/null"), timeout=0.3)
+
+    started = time.time()
+    mux.start()
+    channel = mux.open_channel(1, at_cmd_delay=0)
+    for _ in range(3):
+        channel.send("AT")
+        assert channel.read_lines() == ["AT", "OK"]
+    elapsed = time.time() - started
+
+    # Three reads ending after 0.3 s of silence, nothing waits for the 5 s
+    # timeout of the port
+    assert elapsed < 2
+    mux.running = False
+
+
+def test_two_channels_at_the_same_time():
+    peer = CmuxPeer(delays={"AT+CGPSINFO": 0.6})
+    mux = Cmux(peer, timeout=0.8)
+    mux.start()
+    gps = mux.open_channel(1, at_cmd_delay=0)
+    sms = mux.open_channel(2, at_cmd_delay=0)
+
+    finished = {}
+
+    def run(channel, cmd):
+        channel.send(cmd)
+        read = channel.read_lines()
+        finished[cmd] = (time.time(), read)
+
+    started = time.time()
+    threads = [
+        threading.Thread(target=run, args=(gps, "AT+CGPSINFO")),
+        threading.Thread(target=run, args=(sms, 'AT+CMGL="ALL"')),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    mux.close()
+
+    assert finished["AT+CGPSINFO"][1] == ["AT+CGPSINFO", "OK"]
+    assert finished['AT+CMGL="ALL"'][1] == ['AT+CMGL="ALL"', "OK"]
+    # The slow GPS command does not hold back the SMS channel, whose reads
+    # end after `timeout` of silence
+    assert finished['AT+CMGL="ALL"'][0] - started < 1.2
+    assert finished["AT+CGPSINFO"][0] - started >= 1.4
+
+
+def test_modem_on_channel():
+    mux = Cmux(CmuxPeer(), timeout=0.2)
+    mux.start()
+
+    modem = Modem(None, comm=mux.open_channel(1, at_cmd_delay=0))
+    modem.comm.send("AT")
+    assert modem.comm.read_lines() == ["AT", "OK"]
+    mux.close()
+
+
+def test_modem_disc_is_answered_with_response():
+    peer = CmuxPeer()
+    mux = Cmux(peer)
+    mux.start()
+    mux.open_channel(1, at_cmd_delay=0)
+
+    peer.send_frame(encode_frame(1, DISC | PF, cr=0))
+    deadline = time.time() + 1
+    while 1 in mux.channels and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert 1 not in mux.channels
+    assert encode_frame(1, UA | PF, cr=0) in peer.written
+    mux.close()
+
+
+def test_close_shuts_down_multiplexer():
+    peer = CmuxPeer()
+    mux = Cmux(peer)
+    mux.start()
+    mux.open_channel(1, at_cmd_delay=0)
+    mux.close()
+
+    assert (1, DISC, b"") in peer.frames
+    assert not mux.reader.is_alive()
+    assert not peer.muxed
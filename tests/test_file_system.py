@@ -0,0 +1,161 @@
+import pytest
+from file_system import FileSystem
+from sim_modem import Modem
+
+PATH = "C:\\User\\log.txt"
+# Chunk containing what looks like the end of a reply
+DATA = (b"cmd ok\r\nOK\r\n" + bytes(range(52))) + b"tail\r\nERROR\r\n" + b"x" * 23
+
+
+def reply(data: bytes) -> list:
+    # Echo, CONNECT header, raw data, OK
+    return ["", "CONNECT {}".format(len(data)), data.decode("ISO-8859-1") + "\r\nOK"]
+
+
+def make_fs(fake_serial) -> FileSystem:
+    fake_serial.replies["AT+FSFLSIZE=" + PATH] = [
+        "+FSFLSIZE: {}".format(len(DATA)),
+        "",
+        "OK",
+    ]
+    fake_serial.replies["AT+FSREAD={},1,64,0".format(PATH)] = reply(DATA[:64])
+    fake_serial.replies["AT+FSREAD={},1,36,64".format(PATH)] = reply(DATA[64:])
+    return FileSystem(Modem("/dev/null", at_cmd_delay=0), chunk_size=64)
+
+
+def test_download_is_binary_safe(fake_serial, tmp_path):
+    fs = make_fs(fake_serial)
+    progress = []
+
+    summary = fs.download(
+        PATH, str(tmp_path / "log.txt"), on_progress=lambda *x: progress.append(x)
+    )
+
+    assert (tmp_path / "log.txt").read_bytes() == DATA
+    assert summary["bytes"] == len(DATA)
+    assert [x[:2] for x in progress] == [(64, 100), (100, 100)]
+    # Nothing left on the port
+    assert fs.modem.comm.modem_serial.output == b""
+
+
+def test_download_resume(fake_serial, tmp_path):
+    fs = make_fs(fake_serial)
+    (tmp_path / "log.txt").write_bytes(DATA[:64])
+
+    summary = fs.download(PATH, str(tmp_path / "log.txt"), resume=True)
+
+    assert (tmp_path / "log.txt").read_bytes() == DATA
+    assert summary["bytes"] == 36
+    assert not any(b",1,64,0" in x for x in fs.modem.comm.modem_serial.written)
+
+
+def test_download_empty_chunk_fails(fake_serial, tmp_path):
+    fs = make_fs(fake_serial)
+    # The file shrank after AT+FSFLSIZE
+    fake_serial.replies["AT+FSREAD={},1,64,0".format(PATH)] = reply(b"")
+
+    with pytest.raises(Exception, match="Remote file shorter than expected"):
+        fs.download(PATH, str(tmp_path / "log.txt"))
+
+
+class RemoteFile:
+    """Modem side of PATH for the uploads, `fail` writes fail after 10 bytes"""
+
+    def __init__(self, fake_serial, content=None, fail=0):
+        self.content = content
+        self.fail = fail
+        fake_serial.replies["AT+FSFLSIZE=" + PATH] = self.size
+        fake_serial.replies["AT+FSCREATE=" + PATH] = self.create
+        fake_serial.replies["AT+FSDEL=" + PATH] = self.delete
+        for size in range(1, 65):
+            cmd = "AT+FSWRITE={},1,{},10".format(PATH, size)
+            fake_serial.replies[cmd] = [">"]
+            fake_serial.data_replies[cmd] = self.write
+
+    def size(self):
+        if self.content is None:
+            return ["ERROR"]
+        return ["+FSFLSIZE: {}".format(len(self.content)), "", "OK"]
+
+    def create(self):
+        self.content = b""
+        return ["OK"]
+
+    def delete(self):
+        self.content = None
+        return ["OK"]
+
+    def write(self, data):
+        if self.fail:
+            self.fail -= 1
+            self.content += data[:10]
+            return ["", "ERROR"]
+        self.content += data
+        return ["", "OK"]
+
+
+def upload(tmp_path, **kwargs):
+    (tmp_path / "log.txt").write_bytes(DATA)
+    fs = FileSystem(Modem("/dev/null", at_cmd_delay=0), chunk_size=64)
+    return fs, fs.upload(str(tmp_path / "log.txt"), PATH, **kwargs)
+
+
+def test_upload_sends_data_after_prompt(fake_serial, tmp_path):
+    remote = RemoteFile(fake_serial, content=b"old")
+
+    fs, summary = upload(tmp_path)
+
+    assert remote.content == DATA
+    assert summary["bytes"] == len(DATA)
+    written = fs.modem.comm.modem_serial.written
+    assert b"AT+FSDEL=" + PATH.encode() + b"\r" in written
+    i = written.index("AT+FSWRITE={},1,64,10\r".format(PATH).encode())
+    assert written[i + 1] == DATA[:64]
+    assert written[i + 3] == DATA[64:]
+
+
+def test_upload_resumes_failed_chunk_from_remote_size(fake_serial, tmp_path):
+    remote = RemoteFile(fake_serial, fail=1)
+
+    fs, _ = upload(tmp_path)
+
+    assert remote.content == DATA
+    # The next chunk starts after the 10 bytes the modem holds
+    written = fs.modem.comm.modem_serial.written
+    assert [x for x in written if not x.startswith(b"AT")] == [
+        DATA[:64],
+        DATA[10:74],
+        DATA[74:],
+    ]
+
+
+def test_upload_resume(fake_serial, tmp_path):
+    remote = RemoteFile(fake_serial, content=DATA[:64])
+
+    fs, summary = upload(tmp_path, resume=True)
+
+    assert remote.content == DATA
+    assert summary["bytes"] == 36
+    written = fs.modem.comm.modem_serial.written
+    assert not any(b"FSCREATE" in x or b"FSDEL" in x for x in written)
+
+
+def test_list_dir(fake_serial):
+    fake_serial.replies["AT+FSLS"] = [
+        "+FSLS: SUBDIRECTORIES:",
+        "FTP",
+        "",
+        "+FSLS: FILES:",
+        "prompt.amr",
+        "log.txt",
+        "",
+        "OK",
+    ]
+    fs = FileSystem(Modem("/dev/null", at_cmd_delay=0))
+
+    assert fs.list_dir("C:\\User\\") == [
+        {"name": "FTP", "is_dir": True},
+        {"name": "prompt.amr", "is_dir": False},
+        {"name": "log.txt", "is_dir": False},
+    ]
+    assert b"AT+FSCD=C:\\User\\\r" in fs.modem.comm.modem_serial.written
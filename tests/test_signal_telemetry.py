@@ -0,0 +1,120 @@
+import math
+import random
+import time
+import pytest
+from sim_modem import Modem, SignalQuality
+from signal_telemetry import SignalTelemetry
+
+
+class Reports:
+    """Dedicated comm receiving +CSQ reports"""
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.sent = []
+        self.replies = []
+
+    def send(self, cmd):
+        self.sent.append(cmd)
+        self.replies.append([cmd, "OK"])
+
+    def read_lines(self):
+        if self.replies:
+            return self.replies.pop(0)
+        if self.lines:
+            return [self.lines.pop(0)]
+        time.sleep(0.01)
+        return []
+
+
+def make_telemetry(fake_serial, **kwargs):
+    fake_serial.replies["AT+CSQ"] = ["+CSQ: 19,99", "", "OK"]
+    return SignalTelemetry(Modem("/dev/null", at_cmd_delay=0), **kwargs)
+
+
+def test_rolling_aggregates_match_window(fake_serial):
+    telemetry = make_telemetry(fake_serial, capacity=50)
+    random.seed(7)
+    values = []
+    for i in range(1000):
+        rssi = 99 if i % 13 == 0 else random.randint(0, 31)
+        telemetry.feed("+CSQ: {},99".format(rssi))
+        if rssi == 99:
+            continue
+        values.append(-(111 - 2 * rssi))
+
+        window = sorted(values[-50:])
+        stats = telemetry.stats()
+        assert stats["min"] == window[0]
+        assert stats["max"] == window[-1]
+        assert stats["mean"] == pytest.approx(sum(window) / len(window))
+        assert stats["p90"] == window[math.ceil(0.9 * len(window)) - 1]
+
+    assert stats["count"] == 50
+    assert stats["unknown"] == 77
+    assert [x["dbm"] for x in telemetry.samples()] == values[-50:]
+
+
+def test_empty_stats(fake_serial):
+    stats = make_telemetry(fake_serial).stats()
+
+    assert stats["count"] == 0
+    assert stats["min"] is None
+    assert stats["p50"] is None
+
+
+def test_percentile_range(fake_serial):
+    telemetry = make_telemetry(fake_serial)
+    telemetry.add_sample(10)
+
+    assert telemetry.percentile(0) == -91
+    assert telemetry.percentile(100) == -91
+    with pytest.raises(Exception):
+        telemetry.percentile(101)
+    with pytest.raises(Exception):
+        telemetry.percentile(-1)
+
+
+def test_events(fake_serial):
+    events = []
+    telemetry = make_telemetry(fake_serial, thresholds=(-95,), on_event=events.append)
+
+    for rssi in (10, 5, 99, 20):
+        telemetry.add_sample(rssi)
+
+    assert [x["type"] for x in events] == [
+        "quality",
+        "threshold",
+        "unknown",
+        "quality",
+        "threshold",
+    ]
+    assert events[0]["from"] == SignalQuality.FAIR
+    assert events[0]["to"] == SignalQuality.LOW
+    assert events[1]["direction"] == "below"
+    assert events[4]["direction"] == "above"
+    assert telemetry.stats()["transitions"] == 2
+
+
+def test_polls_without_dedicated_comm(fake_serial):
+    telemetry = make_telemetry(fake_serial, interval=0.01)
+
+    assert telemetry.start() == "poll"
+    time.sleep(0.1)
+    telemetry.stop()
+
+    written = telemetry.modem.comm.modem_serial.written
+    assert not any(b"AUTOCSQ" in x for x in written)
+    assert telemetry.stats()["max"] == -73
+
+
+def test_reports_on_dedicated_comm(fake_serial):
+    reports = Reports(["+CSQ: 19,99", "OK", "+CSQ: 20,99"])
+    telemetry = make_telemetry(fake_serial, comm=reports)
+
+    assert telemetry.start() == "auto"
+    time.sleep(0.1)
+    telemetry.stop()
+
+    assert reports.sent == ["AT+AUTOCSQ=1,0", "AT+AUTOCSQ=0"]
+    assert [x["dbm"] for x in telemetry.samples()] == [-73, -71]
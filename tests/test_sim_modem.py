@@ -0,0 +1,105 @@
+from sim_modem import Modem, OperatorStatus
+
+
+def test_get_serving_cell_lte(fake_serial):
+    fake_serial.replies["AT+CPSI?"] = [
+        "+CPSI: LTE,Online,262-02,0x6B5C,27447297,216,EUTRAN-BAND3,1300,5,5,-94,-1037,-752,14",
+        "",
+        "OK",
+    ]
+    cell = Modem("/dev/null", at_cmd_delay=0).get_serving_cell()
+
+    assert cell["rat"] == "LTE"
+    assert cell["mcc_mnc"] == "262-02"
+    assert cell["cell_id"] == "27447297"
+    assert cell["band"] == "EUTRAN-BAND3"
+    assert cell["rsrq"] == -9.4
+    assert cell["rsrp"] == -103.7
+    assert cell["sinr"] == 8
+
+
+def test_get_serving_cell_lte_cat_m1(fake_serial):
+    fake_serial.replies["AT+CPSI?"] = [
+        "+CPSI: LTE CAT-M1,Online,460-00,0x5A1E,187214780,257,EUTRAN-BAND3,1300,5,5,-94,-850,-545,15",
+        "",
+        "OK",
+    ]
+    cell = Modem("/dev/null", at_cmd_delay=0).get_serving_cell()
+
+    assert cell["rat"] == "LTE CAT-M1"
+    assert cell["cell_id"] == "187214780"
+    assert cell["band"] == "EUTRAN-BAND3"
+    assert cell["rsrq"] == -9.4
+    assert cell["rsrp"] == -85.0
+    assert cell["sinr"] == 10
+
+
+def test_get_serving_cell_lte_nb_iot(fake_serial):
+    fake_serial.replies["AT+CPSI?"] = [
+        "+CPSI: LTE NB-IOT,Online,262-01,0x1A2B,30867201,112,EUTRAN-BAND8,3740,0,0,-108,-1125,-940,3",
+        "",
+        "OK",
+    ]
+    cell = Modem("/dev/null", at_cmd_delay=0).get_serving_cell()
+
+    assert cell["rat"] == "LTE NB-IOT"
+    assert cell["band"] == "EUTRAN-BAND8"
+    assert cell["rsrq"] == -10.8
+    assert cell["rsrp"] == -112.5
+    assert cell["sinr"] == -14
+
+
+def test_get_serving_cell_gsm_band(fake_serial):
+    fake_serial.replies["AT+CPSI?"] = [
+        "+CPSI: GSM,Online,262-02,0x6B5C,12401,27 EGSM 900,-64,2110,42-42",
+        "",
+        "OK",
+    ]
+    cell = Modem("/dev/null", at_cmd_delay=0).get_serving_cell()
+
+    assert cell["rat"] == "GSM"
+    assert cell["cell_id"] == "12401"
+    assert cell["band"] == "EGSM 900"
+    assert cell["rsrp"] is None
+
+
+def test_get_serving_cell_no_service(fake_serial):
+    fake_serial.replies["AT+CPSI?"] = ["+CPSI: NO SERVICE,Online", "", "OK"]
+    cell = Modem("/dev/null", at_cmd_delay=0).get_serving_cell()
+
+    assert cell["rat"] == "NO SERVICE"
+    assert cell["band"] is None
+
+
+def test_operator_scan(fake_serial):
+    fake_serial.replies["AT+COPS=?"] = [
+        '+COPS: (2,"Vodafone D2","Vodafone","26202",7),(1,"Telekom.de","TDG","26201",7),,(0-4),(0-2)',
+        "",
+        "OK",
+    ]
+    modem = Modem("/dev/null", at_cmd_delay=0)
+    assert modem.get_scanned_operators() is None
+
+    reported = []
+    scan = modem.start_operator_scan(on_operator=reported.append)
+    operators = scan.result(timeout=5)
+
+    assert [x["numeric"] for x in operators] == ["26202", "26201"]
+    assert operators[0]["status"] == OperatorStatus.CURRENT
+    assert operators[1]["act"] == 7
+    assert reported == operators
+    assert scan.age() is not None
+    assert modem.get_scanned_operators(max_age=60) == operators
+    assert modem.get_scanned_operators(max_age=-1) is None
+
+
+def test_operator_scan_error(fake_serial):
+    fake_serial.replies["AT+COPS=?"] = ["ERROR"]
+    modem = Modem("/dev/null", at_cmd_delay=0)
+
+    scan = modem.start_operator_scan()
+    scan.wait(timeout=5)
+
+    assert isinstance(scan.error, Exception)
+    assert scan.finished_at is not None
+    assert modem.get_scanned_operators() is None
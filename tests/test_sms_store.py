@@ -0,0 +1,165 @@
+import pytest
+from datetime import datetime
+from sim_modem import Modem
+from sms_store import SmsStore
+
+CMGL = [
+    '+CMGL: 1,"REC READ","+491234567890","","12/08/14,14:01:06+32"',
+    "Test",
+    "",
+    '+CMGL: 2,"REC UNREAD","+491111111111","","12/08/15,10:00:00+32"',
+    "100% off_today",
+    "",
+    "OK",
+]
+CMGR = [
+    '+CMGR: "REC UNREAD","+492222222222","","12/08/16,09:30:00+32"',
+    "Hello there",
+    "",
+    "OK",
+]
+
+# Drafts and sent messages have no timestamp
+CMGL_MIXED = [
+    '+CMGL: 1,"REC READ","+491234567890","","12/08/14,14:01:06+32"',
+    "Test",
+    "",
+    '+CMGL: 2,"STO UNSENT","+493333333333",""',
+    "Draft",
+    "",
+    '+CMGL: 4,"STO SENT","+494444444444",""',
+    "Sent",
+    "",
+    "OK",
+]
+
+
+def make_store(fake_serial, **kwargs):
+    fake_serial.replies['AT+CMGL="ALL"'] = CMGL
+    fake_serial.replies["AT+CMGR=3"] = CMGR
+    modem = Modem("/dev/null", at_cmd_delay=0)
+    return modem, SmsStore(modem, ":memory:", **kwargs)
+
+
+def deleted(modem) -> list:
+    return [x.decode().strip() for x in modem.comm.modem_serial.written if b"CMGD" in x]
+
+
+def test_get_sms_list(fake_serial):
+    fake_serial.replies['AT+CMGL="ALL"'] = CMGL
+    sms = Modem("/dev/null", at_cmd_delay=0).get_sms_list()
+
+    assert [x["index"] for x in sms] == ["1", "2"]
+    assert sms[0]["number"] == "+491234567890"
+    assert sms[0]["date"] == "12/08/14"
+    assert sms[0]["time"] == "14:01:06"
+    assert sms[1]["message"] == "100% off_today"
+
+
+def test_get_sms(fake_serial):
+    fake_serial.replies["AT+CMGR=3"] = CMGR
+    sms = Modem("/dev/null", at_cmd_delay=0).get_sms(3)
+
+    assert sms == {
+        "slot": "3",
+        "status": "REC UNREAD",
+        "number": "+492222222222",
+        "date": "12/08/16",
+        "time": "09:30:00",
+        "message": "Hello there",
+    }
+
+
+def test_sync_stores_and_frees_all_slots(fake_serial):
+    modem, store = make_store(fake_serial)
+
+    assert store.sync() == 2
+    assert store.count() == 2
+    assert deleted(modem) == ["AT+CMGD=1", "AT+CMGD=2"]
+    # Already stored messages are not duplicated
+    assert store.sync() == 0
+    assert store.count() == 2
+
+
+def test_sync_skips_stored_drafts(fake_serial):
+    modem, store = make_store(fake_serial)
+    fake_serial.replies['AT+CMGL="ALL"'] = CMGL_MIXED
+
+    assert [x["index"] for x in modem.get_sms_list()] == ["1"]
+    assert store.sync() == 1
+    assert [x["message"] for x in store.find()] == ["Test"]
+    assert deleted(modem) == ["AT+CMGD=1"]
+
+
+def test_get_sms_draft_fails(fake_serial):
+    modem, store = make_store(fake_serial)
+    fake_serial.replies["AT+CMGR=2"] = [
+        '+CMGR: "STO UNSENT","+493333333333",""',
+        "Draft",
+        "",
+        "OK",
+    ]
+
+    with pytest.raises(Exception, match="Command failed"):
+        modem.get_sms(2)
+    assert deleted(modem) == []
+
+
+def test_cmti_notification_pulls_slot(fake_serial):
+    modem, store = make_store(fake_serial)
+
+    assert store.handle_line("OK") == 0
+    assert store.handle_line('+CMTI: "SM",3') == 1
+    assert store.find(number="+492222222222")[0]["message"] == "Hello there"
+    assert deleted(modem) == ["AT+CMGD=3"]
+
+
+def test_poll_reads_dedicated_comm(fake_serial):
+    class Notifications:
+        def read_lines(self):
+            return ["", '+CMTI: "SM",3']
+
+    modem, store = make_store(fake_serial, comm=Notifications())
+
+    assert store.poll() == 1
+    assert store.count() == 1
+
+
+def test_poll_without_dedicated_comm_scans_slots(fake_serial):
+    modem, store = make_store(fake_serial)
+
+    assert store.poll() == 2
+
+
+def test_find(fake_serial):
+    modem, store = make_store(fake_serial)
+    store.sync()
+    store.handle_line('+CMTI: "SM",3')
+
+    assert [x["number"] for x in store.find(number="+491234567890")] == [
+        "+491234567890"
+    ]
+    assert len(store.find(since=datetime(2012, 8, 15))) == 2
+    assert len(store.find(since="2012-08-15", until="2012-08-16")) == 1
+    assert store.find(text="there")[0]["number"] == "+492222222222"
+    assert store.find(text='"there') != []
+    assert len(store.find(limit=1)) == 1
+
+
+def test_find_text_without_fts(fake_serial):
+    modem, store = make_store(fake_serial)
+    store.fts = False
+    store.sync()
+
+    # LIKE wildcards in the text are matched literally
+    assert [x["message"] for x in store.find(text="0% off_")] == ["100% off_today"]
+    assert store.find(text="%") != []
+    assert store.find(text="_x") == []
+
+
+def test_text_index_follows_deletes(fake_serial):
+    modem, store = make_store(fake_serial)
+    store.sync()
+
+    store.delete(store.find(text="Test")[0]["id"])
+    assert store.find(text="Test") == []